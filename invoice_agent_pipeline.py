@@ -9,18 +9,475 @@ PHASE C: Invoice Processing with Content-Based Linkage
 This module implements the core classes for the multi-contract framework.
 """
 
+import bisect
+import functools
 import json
+import os
 import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Tuple, Optional
-from docx import Document
+from lxml import etree
 import logging
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Precompiled patterns (compiled once at import instead of on every call)
+_PROGRAM_CODE_RE = re.compile(r"\b([A-Z]{2,4})\b")
+# Uppercase filename tokens that are never program codes
+_PROGRAM_STOPWORDS = frozenset(
+    "FOR PDF SOW MSA THE INV DOC USD EUR ALL AND NEW OLD PO DN REV".split()
+)
+_FILENAME_DATE_RE = re.compile(r"\d{4}[\s\-_]\d{2}[\s\-_]\d{2}")
+_YEAR_RE = re.compile(r"\b(202\d)\b")
+
+# Below this many documents the process pool start-up costs more than it saves
+_PARALLEL_MIN_DOCUMENTS = 4
+
+# Threads used to overlap invoice file reads
+_IO_WORKERS = 16
+
+# Invoice fields reported as matching details for a detected contract
+_DETAIL_KEYS = ("po_number", "vendor", "invoice_date", "amount")
+
+# Invoice file extension -> preference when several formats share a base name
+_INVOICE_EXTENSION_PRIORITY = {"docx": 0, "doc": 1, "pdf": 2}
+
+# Filename keyword -> (priority, document type); lower priority wins
+_DOCUMENT_TYPE_KEYWORDS = {
+    "MSA": (0, "MSA"),
+    "MASTER SERVICE": (0, "MSA"),
+    "SOW": (1, "SOW"),
+    "STATEMENT OF WORK": (1, "SOW"),
+    "ORDER FORM": (2, "ORDER_FORM"),
+    "PURCHASE ORDER": (3, "PURCHASE_ORDER"),
+    "PO": (3, "PURCHASE_ORDER"),
+    "DELIVERY": (4, "DELIVERY_NOTE"),
+    "DN": (4, "DELIVERY_NOTE"),
+}
+# Plain substring keywords in one alternation; the lookahead lets
+# overlapping keywords (e.g. "PO" in "PORDER FORM") each be reported
+_DOCUMENT_TYPE_RE = re.compile(
+    "(?=({}))".format("|".join(re.escape(k) for k in _DOCUMENT_TYPE_KEYWORDS))
+)
+
+# Amount digits with optional thousands separators and decimals. At least one
+# digit is required, so the captured text (minus commas) is always a valid float.
+_AMOUNT_VALUE = r"([\d,]*\d[\d,]*\.?\d*|[\d,]+\.\d+)"
+
+# Identifier value (invoice ID, PO number). Besides a-z, IGNORECASE [A-Z] also
+# matched "\u0130", "\u0131", "\u017f" and the Kelvin sign, which lowercasing
+# does not map into a-z, so they are listed explicitly.
+_ID_VALUE = r"([a-z0-9\-\u0130\u0131\u017f\u212a]+)"
+
+# Invoice field patterns, in priority order within each tuple. Patterns are
+# written in lowercase and run against the lowercased content (see
+# _lower_same_length), so they need no IGNORECASE; captured values are sliced
+# from the original content by group span. Each pattern is paired with a
+# lowercase literal every match must contain (None if there is no such
+# literal), so the regex can be skipped when the keyword is absent.
+_INVOICE_ID_RES = tuple(
+    (re.compile(p), literal)
+    for p, literal in (
+        (r"invoice\s*#:?\s*" + _ID_VALUE, "invoice"),
+        (r"invoice\s+number:?\s*" + _ID_VALUE, "invoice"),
+        (r"invoice\s+id:?\s*" + _ID_VALUE, "invoice"),
+    )
+)
+_PO_RES = tuple(
+    (re.compile(p), literal)
+    for p, literal in (
+        (r"po\s+number:\s*" + _ID_VALUE, "po"),
+        (r"po\s*#:?\s*" + _ID_VALUE, "po"),
+        (r"purchase\s+order\s*#?:?\s*" + _ID_VALUE, "purchase"),
+        (r"p\.o\.\s*#?:?\s*" + _ID_VALUE, "p.o."),
+    )
+)
+_VENDOR_RES = tuple(
+    (re.compile(p), literal)
+    for p, literal in (
+        (r"from:\s*([^\n]+)", "from:"),
+        (r"vendor:\s*([^\n]+)", "vendor:"),
+        (r"billed by:\s*([^\n]+)", "billed by:"),
+        (r"supplier:\s*([^\n]+)", "supplier:"),
+    )
+)
+_DATE_RES = tuple(
+    (re.compile(p), literal)
+    for p, literal in (
+        (r"(?:invoice\s+)?date:?\s*(\d{4}[-/]\d{2}[-/]\d{2})", "date"),
+        (r"(\d{4}[-/]\d{2}[-/]\d{2})", None),  # Any YYYY-MM-DD or similar
+    )
+)
+_AMOUNT_RES = tuple(
+    (re.compile(p), literal)
+    for p, literal in (
+        (r"amount:?\s*\$?" + _AMOUNT_VALUE, "amount"),
+        (r"total:?\s*\$?" + _AMOUNT_VALUE, "total"),
+        (r"\$\s*" + _AMOUNT_VALUE, "$"),  # Dollar amounts
+    )
+)
+
+# (pattern, required lowercase literal) pairs, in priority order
+_DESC_RES = tuple(
+    (re.compile(p), literal)
+    for p, literal in (
+        # (a standalone "Services" heading line is handled by _services_heading_line)
+        (r"services?\s*:\s*([^\n]+)", "service"),  # "Services: description text"
+        (r"description:?\s*([^\n]+)", "description"),
+        (r"for:?\s*([^\n]+)", "for"),
+    )
+)
+_TERMS_RES = tuple(
+    (re.compile(p), literal)
+    for p, literal in (
+        (r"payment\s+terms?:?\s*([^\n]+)", "payment"),
+        (r"net\s+(\d+)", "net"),  # Net 30, Net 60, etc.
+    )
+)
+# (lowercase literal, currency code) pairs, in priority order; "$" implies USD
+_CURRENCY_CODES = (
+    ("usd", "USD"),
+    ("eur", "EUR"),
+    ("gbp", "GBP"),
+    ("$", "USD"),
+)
+
+
+def _lower_same_length(text: str) -> str:
+    """Lowercase text without changing its length, so match spans map back"""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    # A few characters (e.g. "\u0130") lowercase to more than one character;
+    # leave those as-is so offsets stay aligned with the original text
+    return "".join(c.lower() if len(c.lower()) == 1 else c for c in text)
+
+
+def _services_heading_line(content: str, content_lower: str) -> Optional[str]:
+    r"""
+    Return the first non-blank line after a standalone "Services" heading.
+
+    String-search equivalent of the regex r"^services\s*\n\s*([^\n]+)"
+    (MULTILINE) on the lowercased content, with the capture stripped.
+    """
+    heading = "services"
+    length = len(content_lower)
+    start = 0 if content_lower.startswith(heading) else -1
+    if start == -1:
+        start = content_lower.find("\n" + heading)
+        if start != -1:
+            start += 1
+    while start != -1:
+        pos = start + len(heading)
+        end = pos
+        while end < length and content_lower[end].isspace():
+            end += 1
+        # The heading must be followed by a line break, then some text
+        if end < length and "\n" in content_lower[pos:end]:
+            eol = content_lower.find("\n", end)
+            return content[end : eol if eol != -1 else length].strip()
+        start = content_lower.find("\n" + heading, pos)
+        if start != -1:
+            start += 1
+    return None
+
+
+# WordprocessingML element tags used when streaming DOCX text
+_W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_BODY = _W_NS + "body"
+_W_P = _W_NS + "p"
+_W_R = _W_NS + "r"
+_W_HYPERLINK = _W_NS + "hyperlink"
+_W_TBL = _W_NS + "tbl"
+_W_TR = _W_NS + "tr"
+_W_TC = _W_NS + "tc"
+_W_T = _W_NS + "t"
+_W_BR = _W_NS + "br"
+_W_TYPE = _W_NS + "type"
+_W_VAL = _W_NS + "val"
+# Run children translated to fixed text (matches python-docx Run.text)
+# OPC package relationships, used to locate the main document part
+_RELS_RELATIONSHIP = (
+    "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+)
+_OFFICE_DOCUMENT_REL_SUFFIX = "/officeDocument"
+_DEFAULT_DOCX_MAIN_PART = "word/document.xml"
+
+_W_RUN_SYMBOLS = {
+    _W_NS + "tab": "\t",
+    _W_NS + "ptab": "\t",
+    _W_NS + "cr": "\n",
+    _W_NS + "noBreakHyphen": "-",
+}
+
+
+def _run_text(run) -> str:
+    """Text of a single <w:r> element"""
+    parts = []
+    for child in run:
+        if child.tag == _W_T:
+            parts.append(child.text or "")
+        elif child.tag == _W_BR:
+            if child.get(_W_TYPE, "textWrapping") == "textWrapping":
+                parts.append("\n")
+        elif child.tag in _W_RUN_SYMBOLS:
+            parts.append(_W_RUN_SYMBOLS[child.tag])
+    return "".join(parts)
+
+
+def _paragraph_text(paragraph) -> str:
+    """Text of a <w:p> element from its runs and hyperlinks"""
+    parts = []
+    for child in paragraph:
+        if child.tag == _W_R:
+            parts.append(_run_text(child))
+        elif child.tag == _W_HYPERLINK:
+            parts.extend(_run_text(run) for run in child if run.tag == _W_R)
+    return "".join(parts)
+
+
+def _is_top_level_cell(tc) -> bool:
+    """True for <w:tc> elements of a table placed directly in the document body"""
+    tbl = tc.getparent().getparent()
+    return tbl is not None and tbl.getparent().tag == _W_BODY
+
+
+def _docx_main_part(archive: zipfile.ZipFile) -> str:
+    """Name of the main document part, from the officeDocument relationship"""
+    try:
+        parser = etree.XMLParser(resolve_entities=False, no_network=True)
+        rels = etree.fromstring(archive.read("_rels/.rels"), parser)
+    except (KeyError, etree.XMLSyntaxError):
+        return _DEFAULT_DOCX_MAIN_PART
+    for rel in rels.iter(_RELS_RELATIONSHIP):
+        if rel.get("Type", "").endswith(_OFFICE_DOCUMENT_REL_SUFFIX) and (
+            rel.get("TargetMode") != "External"
+        ):
+            # Targets are relative to the package root ("/" is optional)
+            return rel.get("Target", "").lstrip("/") or _DEFAULT_DOCX_MAIN_PART
+    return _DEFAULT_DOCX_MAIN_PART
+
+
+def _stream_docx_text(doc_path: Path) -> str:
+    """
+    Extract text from a DOCX file by streaming its main document part
+    (normally word/document.xml).
+
+    Produces the same layout as joining python-docx paragraph texts and then
+    appending every table cell (merged cells repeated per grid column), without
+    building the python-docx object graph.
+
+    Text is collected in lists and joined once. Every cell is kept, including
+    ones without field keywords: labels and values often sit in adjacent cells
+    ("From:" | "R4 Services Inc.") and the field patterns match across them.
+    """
+    paragraphs = []
+    cells = []
+    cell_paragraphs = []
+    # grid column -> text of the cell covering it in the previous row
+    cells_above = {}
+    # grid column of the next top-level cell; None until the row's first cell
+    grid_column = None
+
+    with zipfile.ZipFile(doc_path) as archive, archive.open(
+        _docx_main_part(archive)
+    ) as f:
+        # Vendor-supplied XML: never expand (external) entities, as python-docx
+        for _, el in etree.iterparse(
+            f,
+            events=("end",),
+            tag=(_W_P, _W_TC, _W_TR, _W_TBL),
+            resolve_entities=False,
+            no_network=True,
+        ):
+            parent = el.getparent()
+
+            if el.tag == _W_P:
+                if parent.tag == _W_BODY:
+                    paragraphs.append(_paragraph_text(el))
+                elif parent.tag == _W_TC and _is_top_level_cell(parent):
+                    cell_paragraphs.append(_paragraph_text(el))
+
+            elif el.tag == _W_TC:
+                if not _is_top_level_cell(el):
+                    continue
+                if grid_column is None:
+                    # Rows may skip leading grid columns (w:trPr/w:gridBefore)
+                    grid_column = 0
+                    tr_pr = parent.find(_W_NS + "trPr")
+                    if tr_pr is not None:
+                        grid_before = tr_pr.find(_W_NS + "gridBefore")
+                        if grid_before is not None:
+                            grid_column = int(grid_before.get(_W_VAL, 0))
+                tc_pr = el.find(_W_NS + "tcPr")
+                span, v_merge = 1, None
+                if tc_pr is not None:
+                    grid_span = tc_pr.find(_W_NS + "gridSpan")
+                    if grid_span is not None:
+                        span = int(grid_span.get(_W_VAL, 1))
+                    v_merge_el = tc_pr.find(_W_NS + "vMerge")
+                    if v_merge_el is not None:
+                        v_merge = v_merge_el.get(_W_VAL, "continue")
+
+                if v_merge == "continue":
+                    # Continuation of a vertical merge shows the cell above
+                    text = cells_above.get(grid_column, "")
+                else:
+                    text = "\n".join(cell_paragraphs)
+                cell_paragraphs = []
+
+                for column in range(grid_column, grid_column + span):
+                    cells_above[column] = text
+                cells.extend([text] * span)
+                grid_column += span
+                continue
+
+            elif el.tag == _W_TR:
+                # Rows of nested tables end inside an outer cell and must not
+                # reset the outer row's column
+                if parent.getparent().tag == _W_BODY:
+                    grid_column = None
+                continue
+
+            elif el.tag == _W_TBL and parent.tag == _W_BODY:
+                cells_above = {}
+
+            # Free finished top-level content as we go
+            if parent.tag == _W_BODY:
+                el.clear()
+                while el.getprevious() is not None:
+                    del parent[0]
+
+    return "\n".join(["\n".join(paragraphs)] + cells)
+
+
+def _stream_pdf_text(pdf_path: Path) -> str:
+    """
+    Extract text from a PDF file page by page.
+
+    Uses the fastest installed backend: pypdfium2, then PyMuPDF, then pdfplumber.
+    A backend that cannot parse the file hands over to the next one.
+    """
+    backend_error = None
+
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        pdfium = None
+
+    if pdfium is not None:
+        try:
+            return _pdfium_text(pdfium, pdf_path)
+        except Exception as e:
+            logger.debug(f"pypdfium2 could not read {pdf_path.name}: {e}")
+            backend_error = e
+
+    try:
+        import fitz
+    except ImportError:
+        fitz = None
+
+    if fitz is not None:
+        try:
+            with fitz.open(pdf_path) as pdf:
+                return "".join("\n" + page.get_text() for page in pdf)
+        except Exception as e:
+            logger.debug(f"PyMuPDF could not read {pdf_path.name}: {e}")
+            backend_error = e
+
+    try:
+        import pdfplumber
+    except ImportError:
+        # Report why the installed backends failed rather than the missing one
+        if backend_error is not None:
+            raise backend_error
+        raise
+
+    parts = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            parts.append("\n" + (page.extract_text() or ""))
+    return "".join(parts)
+
+
+def _pdfium_text(pdfium, pdf_path: Path) -> str:
+    """Extract PDF text with pypdfium2, closing every handle it opens"""
+    pdf = pdfium.PdfDocument(str(pdf_path))
+    try:
+        parts = []
+        for page in pdf:
+            try:
+                textpage = page.get_textpage()
+                try:
+                    # PDFium separates lines with CRLF
+                    text = textpage.get_text_range().replace("\r\n", "\n")
+                finally:
+                    textpage.close()
+            finally:
+                page.close()
+            parts.append("\n" + text)
+        return "".join(parts)
+    finally:
+        pdf.close()
+
+
+# Parsed document text is memoized per (absolute path, mtime) so files read in
+# one phase are not parsed again later; a modified file gets a new cache key.
+@functools.lru_cache(maxsize=512)
+def _docx_text_cached(path_str: str, mtime_ns: int) -> str:
+    return _stream_docx_text(Path(path_str))
+
+
+@functools.lru_cache(maxsize=512)
+def _pdf_text_cached(path_str: str, mtime_ns: int) -> str:
+    return _stream_pdf_text(Path(path_str))
+
+
+def _read_docx_text(doc_path: Path) -> str:
+    """Text of a DOCX file, served from the process-wide cache when unchanged"""
+    return _docx_text_cached(os.path.abspath(doc_path), os.stat(doc_path).st_mtime_ns)
+
+
+def _read_pdf_text(pdf_path: Path) -> str:
+    """Text of a PDF file, served from the process-wide cache when unchanged"""
+    return _pdf_text_cached(os.path.abspath(pdf_path), os.stat(pdf_path).st_mtime_ns)
+
+
+def _loads_json(raw: bytes):
+    """Parse JSON bytes (orjson when available, stdlib json otherwise)"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _load_json(path: Path):
+    """Load a JSON file"""
+    with open(path, "rb") as f:
+        return _loads_json(f.read())
+
+
+def _save_json(data, path: Path):
+    """Write data as indented JSON (orjson when available, stdlib json otherwise)"""
+    if orjson is not None:
+        with open(path, "wb") as f:
+            f.write(
+                orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+            )
+    else:
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+
 
 class ContractRelationshipDiscoverer:
     """
@@ -77,60 +534,89 @@ class ContractRelationshipDiscoverer:
     def _extract_document_identifiers(self):
         """Extract parties, program codes, dates, doc types from all documents"""
 
-        for doc_path in sorted(self.contracts_dir.glob("*")):
-            if doc_path.is_dir():
-                continue
-
+        # os.scandir reuses the file type from the directory listing, so no
+        # extra stat() per entry is needed to skip subdirectories
+        try:
+            with os.scandir(self.contracts_dir) as it:
+                filenames = sorted(entry.name for entry in it if not entry.is_dir())
+        except OSError as e:
+            # A missing or unreadable folder has no documents (as with glob)
+            logger.warning(f"Could not list contracts in {self.contracts_dir}: {e}")
+            filenames = []
+
+        # Documents are independent, so larger folders are processed in parallel
+        results = None
+        if len(filenames) >= _PARALLEL_MIN_DOCUMENTS:
+            # Workers may all start up front (fork), so never exceed the work
+            workers = min(os.cpu_count() or 1, len(filenames))
             try:
-                identifiers = {
-                    "filename": doc_path.name,
-                    "filepath": str(doc_path),
-                    "type": self._detect_document_type(doc_path.name),
-                    "parties": self._extract_parties(doc_path),
-                    "program_code": self._extract_program_code(doc_path.name),
-                    "dates": self._extract_dates(doc_path),
-                }
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    results = list(
+                        executor.map(
+                            _identify_document_worker,
+                            repeat(str(self.contracts_dir)),
+                            filenames,
+                            chunksize=max(1, len(filenames) // (workers * 4)),
+                        )
+                    )
+            except Exception as e:
+                logger.warning(f"Process pool unavailable, extracting serially: {e}")
 
+        if results is None:
+            results = [self._identify_document(filename) for filename in filenames]
+
+        for filename, identifiers in zip(filenames, results):
+            if identifiers is not None:
                 self.documents.append(identifiers)
-                logger.info(f"✓ Extracted identifiers from: {doc_path.name}")
+                logger.info(f"✓ Extracted identifiers from: {filename}")
 
-            except Exception as e:
-                logger.error(f"✗ Error processing {doc_path.name}: {str(e)[:100]}")
+    def _identify_document(self, filename: str) -> Optional[Dict]:
+        """Extract identifiers for a single document; returns None on error"""
+        doc_path = self.contracts_dir / filename
+
+        try:
+            return {
+                "filename": filename,
+                "filepath": str(doc_path),
+                "type": self._detect_document_type(filename),
+                "parties": self._extract_parties(doc_path),
+                "program_code": self._extract_program_code(filename),
+                "dates": self._extract_dates(filename),
+            }
+
+        except Exception as e:
+            logger.error(f"✗ Error processing {filename}: {str(e)[:100]}")
+            return None
 
     def _detect_document_type(self, filename: str) -> str:
         """Detect document type from filename"""
-        filename_upper = filename.upper()
-
-        if "MSA" in filename_upper or "MASTER SERVICE" in filename_upper:
-            return "MSA"
-        elif "SOW" in filename_upper or "STATEMENT OF WORK" in filename_upper:
-            return "SOW"
-        elif "ORDER FORM" in filename_upper:
-            return "ORDER_FORM"
-        elif "PURCHASE ORDER" in filename_upper or "PO" in filename_upper:
-            return "PURCHASE_ORDER"
-        elif "DELIVERY" in filename_upper or "DN" in filename_upper:
-            return "DELIVERY_NOTE"
-        else:
-            return "OTHER"
+        # Single scan for all keywords; lowest priority number wins
+        best = (len(_DOCUMENT_TYPE_KEYWORDS), "OTHER")
+        for match in _DOCUMENT_TYPE_RE.finditer(filename.upper()):
+            candidate = _DOCUMENT_TYPE_KEYWORDS[match.group(1)]
+            if candidate < best:
+                best = candidate
+                if best[0] == 0:
+                    break
+        return best[1]
 
-    def _extract_parties(self, doc_path: Path) -> List[str]:
-        """Extract party names from document"""
+    def _extract_parties(self, doc_path: Path) -> Tuple[str, ...]:
+        """Extract party names from document (sorted tuple, usable as a group key)"""
         parties = set()
 
         try:
             if doc_path.suffix.lower() == ".docx":
-                doc = Document(doc_path)
-                text = "\n".join([p.text for p in doc.paragraphs])
+                text = _read_docx_text(doc_path)
             else:
                 # For PDFs and other types, would need pdfplumber etc
                 # For now, extract from filename
                 text = doc_path.name
 
-            # Look for common party names
-            if "bayer" in text.lower():
+            # Look for common party names (lowercase the text once)
+            text_lower = text.lower()
+            if "bayer" in text_lower:
                 parties.add("BAYER")
-            if "r4" in text.lower():
+            if "r4" in text_lower:
                 parties.add("R4")
 
             # Add more party detection as needed
@@ -138,25 +624,24 @@ class ContractRelationshipDiscoverer:
         except Exception as e:
             logger.debug(f"Could not extract parties from {doc_path.name}: {e}")
 
-        return sorted(list(parties))
+        return tuple(sorted(parties))
 
     def _extract_program_code(self, filename: str) -> Optional[str]:
         """Extract program code from filename (e.g., BCH, CAP)"""
-        # Look for patterns like "BCH", "CAP", etc.
-        match = re.search(r"\b([A-Z]{2,4})\b", filename)
-        if match:
+        # Look for patterns like "BCH", "CAP", etc.; first non-stopword wins
+        for match in _PROGRAM_CODE_RE.finditer(filename):
             code = match.group(1)
             # Filter out common words that aren't program codes
-            if code not in ["FOR", "PDF", "SOW", "MSA", "THE"]:
+            if code not in _PROGRAM_STOPWORDS:
                 return code
         return None
 
-    def _extract_dates(self, doc_path: Path) -> Dict:
-        """Extract dates from document name and content"""
+    def _extract_dates(self, filename: str) -> Dict:
+        """Extract dates from document filename"""
         dates = {"found": [], "range": None}
 
         # Extract from filename (YYYY-MM-DD or YYYY-12-10 format)
-        filename_dates = re.findall(r"\d{4}[\s\-_]\d{2}[\s\-_]\d{2}", doc_path.name)
+        filename_dates = _FILENAME_DATE_RE.findall(filename)
         if filename_dates:
             # Convert to YYYY-MM-DD format
             for date_str in filename_dates:
@@ -164,7 +649,7 @@ class ContractRelationshipDiscoverer:
                 dates["found"].append(normalized)
 
         # Also look for year patterns like "2021", "2022"
-        years = re.findall(r"\b(202\d)\b", doc_path.name)
+        years = _YEAR_RE.findall(filename)
         for year in years:
             if year not in dates["found"]:
                 dates["found"].append(year)
@@ -178,7 +663,7 @@ class ContractRelationshipDiscoverer:
         groups = {}
 
         for doc in self.documents:
-            parties_key = tuple(sorted(doc["parties"]))
+            parties_key = doc["parties"]  # already a sorted tuple
             program_key = doc["program_code"] or "UNKNOWN"
 
             # Create group identifier: (parties, program_code)
@@ -197,15 +682,15 @@ class ContractRelationshipDiscoverer:
             contract_id = f"{'_'.join(parties)}_{program_code}_{i}".replace(" ", "_")
 
             # Find date range
-            all_dates = []
+            all_dates = set()
             for doc in docs:
-                all_dates.extend(doc["dates"]["found"])
+                all_dates.update(doc["dates"]["found"])
 
             contract = {
                 "contract_id": contract_id,
                 "parties": list(parties),
                 "program_code": program_code,
-                "dates_found": sorted(set(all_dates)),
+                "dates_found": sorted(all_dates),
                 "documents": docs,
                 "hierarchy": {},
                 "inconsistencies": [],
@@ -280,6 +765,11 @@ class ContractRelationshipDiscoverer:
                 )
 
 
+def _identify_document_worker(contracts_dir: str, filename: str) -> Optional[Dict]:
+    """Process-pool entry point for ContractRelationshipDiscoverer._identify_document"""
+    return ContractRelationshipDiscoverer(contracts_dir)._identify_document(filename)
+
+
 class PerContractRuleExtractor:
     """
     PHASE B: Extracts rules for each discovered contract.
@@ -307,6 +797,9 @@ class PerContractRuleExtractor:
             f"Starting rule extraction for {len(contract_relationships['contracts'])} contract(s)"
         )
 
+        # One timestamp for the whole extraction run
+        extraction_timestamp = datetime.now().isoformat()
+
         for contract in contract_relationships["contracts"]:
             logger.info(f"\nProcessing contract: {contract['contract_id']}")
 
@@ -315,7 +808,7 @@ class PerContractRuleExtractor:
                 "parties": contract["parties"],
                 "program_code": contract["program_code"],
                 "source_documents": [doc["filename"] for doc in contract["documents"]],
-                "extraction_timestamp": datetime.now().isoformat(),
+                "extraction_timestamp": extraction_timestamp,
                 "rules": [],
                 "inconsistencies": [],
                 "hierarchy": contract.get("hierarchy", {}),
@@ -345,15 +838,14 @@ class PerContractRuleExtractor:
 
             self.all_rules["contracts"].append(contract_rules)
 
-        self.all_rules["extraction_timestamp"] = datetime.now().isoformat()
+        self.all_rules["extraction_timestamp"] = extraction_timestamp
 
         return self.all_rules
 
     def _load_existing_rules(self, rules_file: Path) -> List[Dict]:
         """Load existing extracted rules"""
         try:
-            with open(rules_file, "r") as f:
-                existing_rules = json.load(f)
+            existing_rules = _load_json(rules_file)
             return existing_rules
         except Exception as e:
             logger.error(f"Could not load existing rules: {e}")
@@ -376,8 +868,7 @@ class PerContractRuleExtractor:
         """Save extracted rules to JSON file"""
         try:
             output_file.parent.mkdir(parents=True, exist_ok=True)
-            with open(output_file, "w") as f:
-                json.dump(self.all_rules, f, indent=2)
+            _save_json(self.all_rules, output_file)
             logger.info(f"✓ Saved rules to: {output_file}")
         except Exception as e:
             logger.error(f"Error saving rules: {e}")
@@ -398,6 +889,55 @@ class InvoiceLinkageDetector:
     def __init__(self, contract_relationships: Dict, rules_data: Dict = None):
         self.contract_relationships = contract_relationships
         self.rules_data = rules_data or {"contracts": []}
+        self._build_indexes()
+
+    def _build_indexes(self):
+        """
+        Flatten contracts into parallel arrays and lookup indexes.
+
+        The list of contract dicts is walked once here; per-invoice matching
+        only touches these flat structures, never the nested dicts.
+        """
+        # Per contract (indexed by position)
+        contract_ids = []
+        # Per contract document, in contract order
+        filenames = []
+        doc_offsets = []
+        doc_contract_ids = []
+        # Lowercased party / program code -> contract positions
+        self._vendor_index: Dict[str, List[int]] = {}
+        self._program_index: Dict[str, List[int]] = {}
+
+        offset = 0
+        for position, contract in enumerate(self.contract_relationships["contracts"]):
+            contract_id = contract["contract_id"]
+            contract_ids.append(contract_id)
+
+            for doc in contract["documents"]:
+                filenames.append(doc["filename"])
+                doc_offsets.append(offset)
+                doc_contract_ids.append(contract_id)
+                offset += len(doc["filename"]) + 1
+
+            # Parties are lowercased once here, not per invoice
+            for party in contract["parties"]:
+                self._vendor_index.setdefault(party.lower(), []).append(position)
+
+            self._program_index.setdefault(contract["program_code"], []).append(
+                position
+            )
+
+        self._contract_ids = tuple(contract_ids)
+        self._doc_offsets = tuple(doc_offsets)
+        self._doc_contract_ids = tuple(doc_contract_ids)
+
+        # PO lookup: all document filenames joined into one NUL-separated string
+        # (NUL cannot appear in filenames), searched with str.find per PO
+        self._doc_filenames = "\0".join(filenames)
+
+        # Match results memoized per PO number / lowercased invoice vendor
+        self._po_matches: Dict[str, List[Tuple[str, float]]] = {}
+        self._vendor_matches: Dict[str, List[Tuple[str, float]]] = {}
 
     def detect_invoice_contracts(self, invoices_dir: Path) -> Dict:
         """
@@ -426,13 +966,20 @@ class InvoiceLinkageDetector:
             "invoices": [],
         }
 
-        invoice_files = list(Path(invoices_dir).glob("INV-*.json"))
+        invoice_files = sorted(Path(invoices_dir).glob("INV-*.json"))
         logger.info(f"Detecting contracts for {len(invoice_files)} invoice(s)")
 
-        for invoice_file in sorted(invoice_files):
+        # Read all invoice files concurrently (I/O releases the GIL); read
+        # errors surface per invoice through future.result() below
+        with ThreadPoolExecutor(max_workers=_IO_WORKERS) as executor:
+            pending_reads = [
+                executor.submit(invoice_file.read_bytes)
+                for invoice_file in invoice_files
+            ]
+
+        for invoice_file, pending_read in zip(invoice_files, pending_reads):
             try:
-                with open(invoice_file, "r") as f:
-                    invoice_data = json.load(f)
+                invoice_data = _loads_json(pending_read.result())
 
                 # Detect contract for this invoice
                 detection = self._detect_single_invoice(invoice_data)
@@ -533,15 +1080,31 @@ class InvoiceLinkageDetector:
         if not invoice_po:
             return []
 
+        if invoice_po not in self._po_matches:
+            self._po_matches[invoice_po] = self._find_po_references(invoice_po)
+
+        return list(self._po_matches[invoice_po])
+
+    def _find_po_references(self, invoice_po: str) -> List[Tuple[str, float]]:
+        """Find contract documents referencing a PO number (one match per document)"""
         matches = []
 
-        # Search all contract documents for PO references
-        for contract in self.contract_relationships["contracts"]:
-            for doc in contract["documents"]:
-                # In production: would search document content for PO
-                # For now: simple filename matching
-                if invoice_po in doc["filename"]:
-                    matches.append((contract["contract_id"], 0.95))
+        if "\0" in invoice_po:
+            return matches
+
+        # In production: would search document content for PO
+        # For now: simple filename matching
+        position = self._doc_filenames.find(invoice_po)
+        while position != -1:
+            doc_index = bisect.bisect_right(self._doc_offsets, position) - 1
+            matches.append((self._doc_contract_ids[doc_index], 0.95))
+
+            # Continue searching from the next document
+            if doc_index + 1 == len(self._doc_offsets):
+                break
+            position = self._doc_filenames.find(
+                invoice_po, self._doc_offsets[doc_index + 1]
+            )
 
         return matches
 
@@ -552,17 +1115,22 @@ class InvoiceLinkageDetector:
         if not invoice_vendor:
             return []
 
-        matches = []
+        # Invoices from the same vendor share one lookup
+        if invoice_vendor not in self._vendor_matches:
+            matched = set()
 
-        for contract in self.contract_relationships["contracts"]:
-            for party in contract["parties"]:
-                if party.lower() in invoice_vendor or invoice_vendor in party.lower():
-                    # Check if invoice date is within contract date range
-                    confidence = 0.85
-                    matches.append((contract["contract_id"], confidence))
-                    break
+            for party, positions in self._vendor_index.items():
+                if party in invoice_vendor or invoice_vendor in party:
+                    matched.update(positions)
 
-        return matches
+            # Check if invoice date is within contract date range
+            confidence = 0.85
+            self._vendor_matches[invoice_vendor] = [
+                (self._contract_ids[position], confidence)
+                for position in sorted(matched)
+            ]
+
+        return list(self._vendor_matches[invoice_vendor])
 
     def _match_by_program_code(self, invoice_data: Dict) -> List[Tuple[str, float]]:
         """Match invoice to contract by program code"""
@@ -571,30 +1139,29 @@ class InvoiceLinkageDetector:
             + invoice_data.get("reason", "")
         ).lower()
 
-        # Extract program codes from invoice
-        program_codes = re.findall(r"\b([A-Z]{2,4})\b", invoice_description)
+        # Extract program codes from invoice. NOTE: the description is
+        # lowercased above and _PROGRAM_CODE_RE only matches uppercase codes,
+        # so this finds nothing and program-code matching never fires (as in
+        # the original implementation)
+        program_codes = _PROGRAM_CODE_RE.findall(invoice_description)
 
         if not program_codes:
             return []
 
-        matches = []
+        matched = set()
 
-        for contract in self.contract_relationships["contracts"]:
-            if contract["program_code"] in program_codes:
-                confidence = 0.70
-                matches.append((contract["contract_id"], confidence))
+        # Set intersection of known and invoice codes runs in C
+        for code in self._program_index.keys() & program_codes:
+            matched.update(self._program_index[code])
 
-        return matches
+        confidence = 0.70
+        return [
+            (self._contract_ids[position], confidence) for position in sorted(matched)
+        ]
 
     def _get_matching_details(self, invoice_data: Dict, contract_id: str) -> Dict:
         """Get details of why invoice matched this contract"""
-        details = {
-            "po_number": invoice_data.get("po_number"),
-            "vendor": invoice_data.get("vendor"),
-            "invoice_date": invoice_data.get("invoice_date"),
-            "amount": invoice_data.get("amount"),
-        }
-        return details
+        return {key: invoice_data.get(key) for key in _DETAIL_KEYS}
 
 
 class InvoiceParser:
@@ -625,21 +1192,28 @@ class InvoiceParser:
         invoices_dir = Path(invoices_dir)
         logger.info(f"Parsing invoices from: {invoices_dir}")
 
-        # Get all PDF and DOCX files
-        invoice_files = []
-        invoice_files.extend(invoices_dir.glob("INV-*.pdf"))
-        invoice_files.extend(invoices_dir.glob("INV-*.docx"))
-        invoice_files.extend(invoices_dir.glob("INV-*.doc"))
-
-        # Remove duplicates (keep both PDF and DOCX if available)
-        unique_invoices = {}
-        for file_path in sorted(invoice_files):
-            # Extract base name (e.g., "INV-001" from "INV-001.pdf")
-            base_name = file_path.stem  # stem removes extension
-
-            # Prefer DOCX over PDF (more reliable extraction)
-            if base_name not in unique_invoices or file_path.suffix == ".docx":
-                unique_invoices[base_name] = file_path
+        # Get all PDF and DOCX files in a single directory scan, keeping one
+        # file per invoice: prefer DOCX (more reliable extraction), then DOC, then PDF
+        best_files = {}  # base name (e.g. "INV-001") -> (priority, path)
+        try:
+            with os.scandir(invoices_dir) as it:
+                for entry in it:
+                    if not entry.name.startswith("INV-"):
+                        continue
+                    base_name, _, extension = entry.name.rpartition(".")
+                    priority = _INVOICE_EXTENSION_PRIORITY.get(extension)
+                    if priority is None:
+                        continue
+                    current = best_files.get(base_name)
+                    if current is None or priority < current[0]:
+                        best_files[base_name] = (priority, invoices_dir / entry.name)
+        except OSError as e:
+            # A missing or unreadable folder has no invoices (as with glob)
+            logger.warning(f"Could not list invoices in {invoices_dir}: {e}")
+
+        unique_invoices = {
+            base_name: file_path for base_name, (_, file_path) in best_files.items()
+        }
 
         # Parse each unique invoice
         for base_name, file_path in sorted(unique_invoices.items()):
@@ -683,14 +1257,8 @@ class InvoiceParser:
     def _parse_docx(self, file_path: Path) -> str:
         """Extract text from DOCX file"""
         try:
-            doc = Document(file_path)
-            text = "\n".join([p.text for p in doc.paragraphs])
-            # Also get tables
-            for table in doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        text += "\n" + cell.text
-            return text
+            # Paragraphs followed by table cells
+            return _read_docx_text(file_path)
         except Exception as e:
             logger.warning(f"Could not parse DOCX {file_path.name}: {e}")
             return ""
@@ -698,13 +1266,7 @@ class InvoiceParser:
     def _parse_pdf(self, file_path: Path) -> str:
         """Extract text from PDF file"""
         try:
-            import pdfplumber
-
-            text = ""
-            with pdfplumber.open(file_path) as pdf:
-                for page in pdf.pages:
-                    text += "\n" + (page.extract_text() or "")
-            return text
+            return _read_pdf_text(file_path)
         except Exception as e:
             logger.warning(f"Could not parse PDF {file_path.name}: {e}")
             return ""
@@ -729,53 +1291,43 @@ class InvoiceParser:
             "payment_terms": None,
         }
 
-        # Convert to lowercase for searching (but keep original for extraction)
-        content_lower = content.lower()
+        # Lowercase copy used for the keyword substring checks and as the regex
+        # search buffer; values are sliced from the original content by span
+        content_lower = _lower_same_length(content)
 
         # ========== EXTRACT INVOICE ID FROM CONTENT ==========
         # Do NOT use filename! Extract from document fields like:
         #   "Invoice #: INV-001"
         #   "Invoice Number: INV-001"
         #   "Invoice ID: INV-001"
-        invoice_id_patterns = [
-            r"invoice\s*#:?\s*([A-Z0-9\-]+)",
-            r"invoice\s+number:?\s*([A-Z0-9\-]+)",
-            r"invoice\s+id:?\s*([A-Z0-9\-]+)",
-        ]
-        for pattern in invoice_id_patterns:
-            match = re.search(pattern, content, re.IGNORECASE)
+        for pattern, literal in _INVOICE_ID_RES:
+            if literal not in content_lower:
+                continue
+            match = pattern.search(content_lower)
             if match:
-                fields["invoice_id"] = match.group(1).strip()
+                fields["invoice_id"] = content[match.start(1) : match.end(1)].strip()
                 break
 
         # If invoice_id not found in content, log warning (don't use filename)
         if not fields["invoice_id"]:
             logger.warning("Could not extract invoice_id from document content")
         # ========== EXTRACT PO NUMBER FROM CONTENT ==========
-        po_patterns = [
-            r"po\s+number:\s*([A-Z0-9\-]+)",
-            r"po\s*#:?\s*([A-Z0-9\-]+)",
-            r"purchase\s+order\s*#?:?\s*([A-Z0-9\-]+)",
-            r"p\.o\.\s*#?:?\s*([A-Z0-9\-]+)",
-        ]
-        for pattern in po_patterns:
-            match = re.search(pattern, content, re.IGNORECASE)
+        for pattern, literal in _PO_RES:
+            if literal not in content_lower:
+                continue
+            match = pattern.search(content_lower)
             if match:
-                fields["po_number"] = match.group(1).strip()
+                fields["po_number"] = content[match.start(1) : match.end(1)].strip()
                 break
 
         # ========== EXTRACT VENDOR NAME FROM CONTENT ==========
         # Look for patterns like "FROM: Company Name" or "VENDOR: Company Name"
-        vendor_patterns = [
-            r"from:\s*([^\n]+)",
-            r"vendor:\s*([^\n]+)",
-            r"billed by:\s*([^\n]+)",
-            r"supplier:\s*([^\n]+)",
-        ]
-        for pattern in vendor_patterns:
-            match = re.search(pattern, content, re.IGNORECASE)
+        for pattern, literal in _VENDOR_RES:
+            if literal not in content_lower:
+                continue
+            match = pattern.search(content_lower)
             if match:
-                vendor_text = match.group(1).strip()
+                vendor_text = content[match.start(1) : match.end(1)].strip()
                 # Clean up the vendor text
                 vendor_text = vendor_text.split("\n")[0].strip()
                 if vendor_text and len(vendor_text) < 100:  # Sanity check
@@ -784,76 +1336,58 @@ class InvoiceParser:
 
         # ========== EXTRACT INVOICE DATE FROM CONTENT ==========
         # Look for patterns like "Date: 2025-11-01" or "Invoice Date: ..."
-        date_patterns = [
-            r"(?:invoice\s+)?date:?\s*(\d{4}[-/]\d{2}[-/]\d{2})",
-            r"(\d{4}[-/]\d{2}[-/]\d{2})",  # Any YYYY-MM-DD or similar
-        ]
-        for pattern in date_patterns:
-            match = re.search(pattern, content, re.IGNORECASE)
+        for pattern, literal in _DATE_RES:
+            if literal is not None and literal not in content_lower:
+                continue
+            match = pattern.search(content_lower)
             if match:
-                fields["invoice_date"] = match.group(1)
+                fields["invoice_date"] = content[match.start(1) : match.end(1)]
                 break
 
         # ========== EXTRACT AMOUNT FROM CONTENT ==========
         # Look for patterns like "Amount: $15,000.00" or "Total: $..."
-        amount_patterns = [
-            r"amount:?\s*\$?([\d,]+\.?\d*)",
-            r"total:?\s*\$?([\d,]+\.?\d*)",
-            r"\$\s*([\d,]+\.?\d*)",  # Dollar amounts
-        ]
-        for pattern in amount_patterns:
-            match = re.search(pattern, content, re.IGNORECASE)
+        for pattern, literal in _AMOUNT_RES:
+            if literal not in content_lower:
+                continue
+            match = pattern.search(content_lower)
             if match:
-                amount_str = match.group(1).replace(",", "")
-                try:
-                    fields["amount"] = float(amount_str)
-                    break
-                except ValueError:
-                    continue
+                fields["amount"] = float(
+                    content[match.start(1) : match.end(1)].replace(",", "")
+                )
+                break
 
         # ========== EXTRACT SERVICE DESCRIPTION FROM CONTENT ==========
         # Look for sections like "Services:" or description fields
         # The description often appears on the line after a standalone "Services" line
-        desc_patterns = [
-            r"^Services\s*\n\s*([^\n]+)",  # Standalone "Services" at line start, capture next line
-            r"services?\s*:\s*([^\n]+)",  # "Services: description text"
-            r"description:?\s*([^\n]+)",
-            r"for:?\s*([^\n]+)",
-        ]
-        for pattern in desc_patterns:
-            match = re.search(pattern, content, re.IGNORECASE | re.MULTILINE)
-            if match:
-                desc_text = match.group(1).strip()
-                if desc_text and len(desc_text) < 200:  # Sanity check
-                    fields["services_description"] = desc_text
-                    break
+        desc_text = _services_heading_line(content, content_lower)
+        if desc_text and len(desc_text) < 200:  # Sanity check
+            fields["services_description"] = desc_text
+        else:
+            for pattern, literal in _DESC_RES:
+                if literal not in content_lower:
+                    continue
+                match = pattern.search(content_lower)
+                if match:
+                    desc_text = content[match.start(1) : match.end(1)].strip()
+                    if desc_text and len(desc_text) < 200:  # Sanity check
+                        fields["services_description"] = desc_text
+                        break
 
         # ========== EXTRACT PAYMENT TERMS FROM CONTENT ==========
         # Look for patterns like "Payment Terms: Net 30"
-        terms_patterns = [
-            r"payment\s+terms?:?\s*([^\n]+)",
-            r"net\s+(\d+)",  # Net 30, Net 60, etc.
-        ]
-        for pattern in terms_patterns:
-            match = re.search(pattern, content, re.IGNORECASE)
+        for pattern, literal in _TERMS_RES:
+            if literal not in content_lower:
+                continue
+            match = pattern.search(content_lower)
             if match:
-                fields["payment_terms"] = match.group(1).strip()
+                fields["payment_terms"] = content[match.start(1) : match.end(1)].strip()
                 break
 
         # ========== EXTRACT CURRENCY FROM CONTENT ==========
-        # Look for currency indicators
-        currency_patterns = [
-            r"usd",
-            r"eur",
-            r"gbp",
-            r"\$",  # USD indicator
-        ]
-        for pattern in currency_patterns:
-            if re.search(pattern, content, re.IGNORECASE):
-                if pattern == r"\$":
-                    fields["currency"] = "USD"
-                else:
-                    fields["currency"] = pattern.upper()
+        # Look for currency indicators; plain substring checks, no regex needed
+        for literal, code in _CURRENCY_CODES:
+            if literal in content_lower:
+                fields["currency"] = code
                 break
 
         return fields
@@ -0,0 +1,319 @@
+"""
+Regression checks for invoice_agent_pipeline rewrites.
+
+Each rewritten path must behave like the code it replaced: _stream_docx_text()
+like the python-docx based extraction (paragraph texts, then every table cell
+row by row), the lowercase field patterns like their IGNORECASE originals, the joined
+filename index like the per-document PO loop, and _stream_pdf_text() must
+fall back to the next PDF backend when one fails.
+"""
+
+import re
+import sys
+import zipfile
+
+import pytest
+from docx import Document
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+
+from invoice_agent_pipeline import (
+    InvoiceLinkageDetector,
+    InvoiceParser,
+    _lower_same_length,
+    _services_heading_line,
+    _stream_docx_text,
+    _stream_pdf_text,
+)
+
+
+def _python_docx_text(path):
+    """Reference extraction, as previously done with python-docx"""
+    doc = Document(path)
+    text = "\n".join(p.text for p in doc.paragraphs)
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                text += "\n" + cell.text
+    return text
+
+
+def _rewrite_parts(path, edit):
+    """Rewrite a saved DOCX, passing (name, bytes) of every part through edit"""
+    with zipfile.ZipFile(path) as archive:
+        parts = [(item.filename, archive.read(item)) for item in archive.infolist()]
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, data in parts:
+            archive.writestr(*edit(name, data))
+
+
+def _fill(table):
+    for r, row in enumerate(table.rows):
+        for c, cell in enumerate(row.cells):
+            cell.text = f"r{r}c{c}"
+
+
+def test_nested_table_does_not_reset_vertical_merge_column(tmp_path):
+    doc = Document()
+    doc.add_paragraph("Invoice #: INV-001")
+    table = doc.add_table(rows=3, cols=3)
+    _fill(table)
+    table.cell(1, 2).text = "merged h"
+    table.cell(2, 2).text = "vmerged"
+    table.cell(1, 2).merge(table.cell(2, 2))
+
+    nested_cell = table.cell(2, 1)
+    nested = nested_cell.add_table(rows=2, cols=2)
+    _fill(nested)
+    nested_cell.add_paragraph("after nested")
+
+    path = tmp_path / "nested.docx"
+    doc.save(path)
+    assert _stream_docx_text(path) == _python_docx_text(path)
+
+
+def test_grid_before_offsets_vertical_merge_lookup(tmp_path):
+    doc = Document()
+    table = doc.add_table(rows=2, cols=3)
+    _fill(table)
+
+    # Second row starts one grid column late and continues the merge above
+    top, bottom = table.rows[0]._tr, table.rows[1]._tr
+    bottom.remove(bottom.tc_lst[0])
+    tr_pr = bottom.get_or_add_trPr()
+    grid_before = OxmlElement("w:gridBefore")
+    grid_before.set(qn("w:val"), "1")
+    tr_pr.append(grid_before)
+    top.tc_lst[1].vMerge = "restart"
+    bottom.tc_lst[0].vMerge = "continue"
+
+    path = tmp_path / "grid_before.docx"
+    doc.save(path)
+    assert _stream_docx_text(path) == _python_docx_text(path)
+
+
+def test_external_entities_are_not_resolved(tmp_path):
+    secret = tmp_path / "secret.txt"
+    secret.write_text("TOP SECRET")
+    doc = Document()
+    doc.add_paragraph("Invoice #: INV-001")
+    doc.add_paragraph("PLACEHOLDER")
+    path = tmp_path / "entity.docx"
+    doc.save(path)
+
+    def add_entity(name, data):
+        if name == "word/document.xml":
+            xml = data.decode("utf-8")
+            prolog_end = xml.index("?>") + 2
+            doctype = f'<!DOCTYPE w:document [<!ENTITY x SYSTEM "{secret.as_uri()}">]>'
+            xml = xml[:prolog_end] + doctype + xml[prolog_end:]
+            data = xml.replace("PLACEHOLDER", "before &x; after").encode("utf-8")
+        return name, data
+
+    _rewrite_parts(path, add_entity)
+    text = _stream_docx_text(path)
+    assert "TOP SECRET" not in text
+    assert text == _python_docx_text(path)
+
+
+def test_main_part_is_found_through_package_relationship(tmp_path):
+    doc = Document()
+    doc.add_paragraph("Invoice #: INV-001")
+    path = tmp_path / "renamed.docx"
+    doc.save(path)
+
+    renamed = {
+        "word/document.xml": "word/main.xml",
+        "word/_rels/document.xml.rels": "word/_rels/main.xml.rels",
+    }
+
+    def rename_main_part(name, data):
+        if name in ("_rels/.rels", "[Content_Types].xml"):
+            data = data.replace(b"/word/document.xml", b"/word/main.xml")
+            data = data.replace(b'"word/document.xml"', b'"word/main.xml"')
+        return renamed.get(name, name), data
+
+    _rewrite_parts(path, rename_main_part)
+    with zipfile.ZipFile(path) as archive:
+        assert "word/document.xml" not in archive.namelist()
+    text = _stream_docx_text(path)
+    assert text == "Invoice #: INV-001"
+    assert text == _python_docx_text(path)
+
+
+_SERVICES_HEADING_RE = re.compile(r"^services\s*\n\s*([^\n]+)", re.MULTILINE)
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        "Services\nConsulting - Q4",
+        "Invoice #: 1\nServices\n\n  Consulting - Q4  \nTotal: 5",
+        "Our services\nConsulting",
+        "Billed for services rendered\nmore text",
+        "Services\n   \t",
+        "Header\nServices  \n\n",
+        "Services\r\nConsulting\r\nTotal",
+        "Services \t\v Consulting\nServices\nSecond",
+        "Services\t\vConsulting",
+        "services: x\nServices\nFirst\nServices\nSecond",
+        "Services\nservices\nservices",
+        "SERVICES\nServicesX\nServices\n\u0130 Consulting",
+        "",
+        "services",
+    ],
+)
+def test_services_heading_line_matches_regex(content):
+    content_lower = _lower_same_length(content)
+    match = _SERVICES_HEADING_RE.search(content_lower)
+    expected = content[match.start(1) : match.end(1)].strip() if match else None
+    # A blank capture is rejected by the caller just like no match
+    assert (_services_heading_line(content, content_lower) or None) == (
+        expected or None
+    )
+
+
+# Capture patterns as they were before matching moved to lowercased content
+_IGNORECASE_ID_RE = re.compile(r"invoice\s*#:?\s*([A-Z0-9\-]+)", re.IGNORECASE)
+_IGNORECASE_PO_RE = re.compile(r"po\s*#:?\s*([A-Z0-9\-]+)", re.IGNORECASE)
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "INV-001",
+        "abcnet\u0130invoice",
+        "abc\u0131def",
+        "lo\u017fs",
+        "\u212aelvin-7",
+        "\u0130\u0131\u017f\u212a",
+        "caf\u00e9",
+    ],
+)
+def test_identifier_capture_matches_ignorecase_class(value):
+    content = f"Invoice #:{value}\nPO #: {value}"
+    fields = InvoiceParser()._extract_fields_from_content(content)
+    assert fields["invoice_id"] == _IGNORECASE_ID_RE.search(content).group(1)
+    assert fields["po_number"] == _IGNORECASE_PO_RE.search(content).group(1)
+
+
+def _contract(contract_id, *filenames):
+    return {
+        "contract_id": contract_id,
+        "documents": [{"filename": filename} for filename in filenames],
+        "parties": [],
+        "program_code": "",
+    }
+
+
+def _po_loop(contract_relationships, invoice_po):
+    """Reference PO matching, as previously done per contract document"""
+    matches = []
+    for contract in contract_relationships["contracts"]:
+        for doc in contract["documents"]:
+            if invoice_po in doc["filename"]:
+                matches.append((contract["contract_id"], 0.95))
+    return matches
+
+
+_PO_CONTRACTS = [
+    _contract("C-1", "MSA_PO-100.pdf", "SOW_PO-200.docx"),
+    _contract("C-2", "PO-100_PO-100_amendment.pdf", "PO-300"),
+    _contract("C-3", "PO-300_terms.pdf", "notes.txt", "PO-100"),
+    _contract("C-4"),
+    _contract("C-5", "PO-100-final.pdf", "PO-400", "PO-400"),
+]
+
+
+@pytest.mark.parametrize(
+    "contracts",
+    [_PO_CONTRACTS, _PO_CONTRACTS[::-1], [_contract("C-1")], []],
+    ids=["contracts", "reversed", "no-documents", "no-contracts"],
+)
+@pytest.mark.parametrize(
+    "invoice_po",
+    [
+        # In the last document, twice in one filename, across several
+        # documents of one contract, and at the start of the next filename
+        "PO-100",
+        "PO-400",
+        "PO-300",
+        "PO-3",
+        "pdf",
+        ".",
+        "txt",
+        "PO-999",
+        "PO-300\0PO-100",
+    ],
+)
+def test_po_matches_equal_per_document_loop(contracts, invoice_po):
+    contract_relationships = {"contracts": contracts}
+    detector = InvoiceLinkageDetector(contract_relationships)
+    expected = _po_loop(contract_relationships, invoice_po)
+    assert detector._find_po_references(invoice_po) == expected
+    # Memoized result is served unchanged on the second lookup
+    for _ in range(2):
+        assert detector._match_by_po_number({"po_number": invoice_po}) == expected
+
+
+def _minimal_pdf(text):
+    """Single-page PDF showing text in Helvetica"""
+    stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792]"
+        b" /Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream),
+    ]
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref,
+    )
+    return bytes(pdf)
+
+
+def test_pdf_backend_error_falls_back_and_closes_handles(tmp_path, monkeypatch):
+    pdfium = pytest.importorskip("pypdfium2")
+    pytest.importorskip("pdfplumber")
+    path = tmp_path / "invoice.pdf"
+    path.write_bytes(_minimal_pdf("Invoice #: INV-001"))
+    assert _stream_pdf_text(path) == "\nInvoice #: INV-001"
+
+    closed = []
+    for cls in (pdfium.PdfPage, pdfium.PdfTextPage):
+        close = cls.close
+
+        def tracking_close(self, close=close, name=cls.__name__):
+            closed.append(name)
+            return close(self)
+
+        monkeypatch.setattr(cls, "close", tracking_close)
+
+    def broken_text_range(self, *args, **kwargs):
+        raise pdfium.PdfiumError("broken text page")
+
+    monkeypatch.setattr(pdfium.PdfTextPage, "get_text_range", broken_text_range)
+    # Without PyMuPDF, pdfplumber reads the file pypdfium2 failed on
+    monkeypatch.setitem(sys.modules, "fitz", None)
+    assert _stream_pdf_text(path) == "\nInvoice #: INV-001"
+    assert closed == ["PdfTextPage", "PdfPage"]
+
+
+def test_pdf_backend_error_is_raised_when_no_backend_is_left(tmp_path, monkeypatch):
+    pdfium = pytest.importorskip("pypdfium2")
+    path = tmp_path / "broken.pdf"
+    path.write_bytes(b"%PDF-1.4\nnot really a pdf")
+    monkeypatch.setitem(sys.modules, "fitz", None)
+    monkeypatch.setitem(sys.modules, "pdfplumber", None)
+    with pytest.raises(pdfium.PdfiumError):
+        _stream_pdf_text(path)